@@ -1,177 +1,987 @@
 #!/usr/bin/env python3
 """
 CSV файл процессор с поддержкой фильтрации и агрегации.
+
+Тяжёлые зависимости (numpy, pandas, tabulate, numba) импортируются внутри
+функций, которым они нужны, чтобы не замедлять запуск CLI.
 """
 
+from __future__ import annotations
+
 import argparse
 import csv
+import importlib.util
+import math
+import os
 import sys
-from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Union
-from tabulate import tabulate
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import (TYPE_CHECKING, List, Dict, Any, Callable, Iterable, Iterator,
+                    Optional, Sequence, Tuple, Union)
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    # Данные могут быть DataFrame (из read_csv), словарём колонок (из
+    # read_columns), списком словарей или списком строк (из read_rows)
+    # вместе с заголовками
+    Data = Union[pd.DataFrame, Dict[str, np.ndarray], List[Dict[str, Any]],
+                 List[Sequence[Any]]]
+
+# numba необязательна: при наличии ядра агрегации компилируются при первом вызове
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+# pyarrow необязателен: при наличии используется как движок чтения CSV
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Начиная с этого размера агрегация и числовые фильтры выполняются
+# скомпилированными ядрами numba
+NUMBA_MIN_SIZE = 100_000
+
+# Количество строк в одной части при потоковом чтении файла. Меньше
+# NUMBA_MIN_SIZE: части уже обрабатываются параллельно в map_chunks, поэтому
+# фильтры CLI сравнивают их NumPy и не тратят время на импорт numba
+CHUNK_SIZE = 65536
+
+# Сколько разных нечисловых значений запоминает один предикат gt/lt
+REJECTED_CACHE_SIZE = 1024
+
+# Числа в текстовом виде, которые pyarrow приводит к float64
+_NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$|^[+-]?(inf|infinity|nan)$'
+
+# Общие параметры чтения: значения остаются строками, пустые ячейки не
+# превращаются в NaN
+_READ_OPTIONS = MappingProxyType({
+    'encoding': 'utf-8',
+    'dtype': str,
+    'keep_default_na': False
+})
+
+# Таблицы с большим числом строк выводятся построчно, а не одной строкой
+STREAM_OUTPUT_ROWS = 1000
+
+# Соответствие операторов фильтра внутреннему формату
+_OPERATOR_MAP = MappingProxyType({
+    '==': 'eq',
+    'eq': 'eq',
+    '>': 'gt',
+    'gt': 'gt',
+    '>=': 'gt',
+    '<': 'lt',
+    'lt': 'lt',
+    '<=': 'lt'
+})
+
+
+def _read_header(filepath: str) -> List[str]:
+    """Вернуть заголовок (первую непустую строку) CSV файла."""
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                return row
+    return []
+
+
+def _arrow_chunks(filepath: str, header: List[str],
+                  chunksize: int) -> Iterator[pd.DataFrame]:
+    """Читать CSV файл потоковым парсером pyarrow частями по chunksize строк.
+
+    Все колонки читаются как строки, пустые ячейки остаются пустыми
+    строками, как с _READ_OPTIONS. pyarrow выдаёт блоки по размеру в
+    байтах, поэтому они собираются в части нужного числа строк.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    convert_options = pv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                        null_values=[], strings_can_be_null=False)
+    with pv.open_csv(filepath, convert_options=convert_options) as reader:
+        pending = []
+        rows = 0
+        for batch in reader:
+            pending.append(batch)
+            rows += batch.num_rows
+            while rows >= chunksize:
+                table = pa.Table.from_batches(pending, reader.schema)
+                yield table.slice(0, chunksize).to_pandas()
+                rest = table.slice(chunksize)
+                pending = rest.to_batches()
+                rows = rest.num_rows
+        if rows:
+            yield pa.Table.from_batches(pending, reader.schema).to_pandas()
+
+
+def _to_float(value: Any) -> Optional[float]:
+    """Преобразовать значение в float или вернуть None."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _arrow_numeric(values: Union[np.ndarray, pd.Series]) -> Optional[np.ndarray]:
+    """Привести строковую колонку к float64 парсером чисел pyarrow.
+
+    Возвращает None, если колонка не строковая и pyarrow её не приводит.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        array = pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    if not (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+        return None
+
+    array = pc.utf8_trim_whitespace(array)
+    try:
+        numbers = pc.cast(array, pa.float64())
+    except pa.ArrowInvalid:
+        # В колонке есть нечисловые значения: заменяем их на null перед приведением
+        valid = pc.match_substring_regex(array, _NUMBER_PATTERN, ignore_case=True)
+        numbers = pc.cast(pc.if_else(valid, array, None), pa.float64())
+    return numbers.to_numpy(zero_copy_only=False)
+
+
+def _numeric_array(values: Union[np.ndarray, pd.Series]) -> np.ndarray:
+    """Преобразовать колонку в массив float64, нечисловые значения становятся NaN."""
+    import numpy as np
+    import pandas as pd
+
+    if HAS_PYARROW:
+        numbers = _arrow_numeric(values)
+        if numbers is not None:
+            return numbers
+    return np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+
+
+def _op_eq(values: Union[np.ndarray, pd.Series], target: Any) -> np.ndarray:
+    """Равенство без учёта регистра для всей колонки."""
+    import numpy as np
+
+    target_low = str(target).casefold()
+    # Перебор массива объектов заметно быстрее, чем перебор Series
+    values = np.asarray(values, dtype=object)
+    return np.fromiter((str(value).casefold() == target_low for value in values),
+                       dtype=bool, count=len(values))
+
+
+def _op_gt(values: Union[np.ndarray, pd.Series], target: Any) -> np.ndarray:
+    """Больше для всей колонки, нечисловые значения не проходят фильтр."""
+    return _numeric_mask(values, target, 'gt', 'greater')
+
+
+def _op_lt(values: Union[np.ndarray, pd.Series], target: Any) -> np.ndarray:
+    """Меньше для всей колонки, нечисловые значения не проходят фильтр."""
+    return _numeric_mask(values, target, 'lt', 'less')
+
+
+def build_predicate(key: Union[str, int], operator: str,
+                    value: Any) -> Callable[[Any], bool]:
+    """Построить предикат строки, специализированный под конкретный фильтр.
+
+    Колонка (имя или позиция) и преобразованное значение фильтра
+    фиксируются в замыкании, поэтому на строку приходится один вызов
+    функции без выбора оператора на каждой строке.
+    """
+    if operator == 'eq':
+        target_low = str(value).casefold()
+
+        def predicate(row, key=key, target_low=target_low):
+            return str(row[key]).casefold() == target_low
+        return predicate
+
+    if operator not in ('gt', 'lt'):
+        raise ValueError(f"Неподдерживаемый оператор: {operator}")
+
+    target_f = _to_float(value)
+    if target_f is None:
+        return lambda row: False
+
+    # Значения, на которых float() уже упал: повторные "n/a" и пустые
+    # ячейки отсекаются поиском в множестве, без раскрутки исключения.
+    rejected = set()
+
+    if operator == 'gt':
+        def predicate(row, key=key, target_f=target_f, rejected=rejected):
+            value = row[key]
+            try:
+                if value in rejected:
+                    return False
+                return float(value) > target_f
+            except ValueError:
+                if len(rejected) < REJECTED_CACHE_SIZE:
+                    rejected.add(value)
+                return False
+            except TypeError:
+                # None, списки и другие значения, которые не число и не строка
+                return False
+    else:
+        def predicate(row, key=key, target_f=target_f, rejected=rejected):
+            value = row[key]
+            try:
+                if value in rejected:
+                    return False
+                return float(value) < target_f
+            except ValueError:
+                if len(rejected) < REJECTED_CACHE_SIZE:
+                    rejected.add(value)
+                return False
+            except TypeError:
+                # None, списки и другие значения, которые не число и не строка
+                return False
+    return predicate
+
+
+def _nb_mean(values: np.ndarray) -> float:
+    """Среднее значение массива float64 за один проход."""
+    total = 0.0
+    for i in range(values.shape[0]):
+        total += values[i]
+    return total / values.shape[0]
+
+
+def _nb_min(values: np.ndarray) -> float:
+    """Минимум массива float64 за один проход."""
+    result = values[0]
+    for i in range(1, values.shape[0]):
+        if values[i] < result:
+            result = values[i]
+    return result
+
+
+def _nb_max(values: np.ndarray) -> float:
+    """Максимум массива float64 за один проход."""
+    result = values[0]
+    for i in range(1, values.shape[0]):
+        if values[i] > result:
+            result = values[i]
+    return result
+
+
+def _nb_mask_kernels() -> Dict[str, Callable]:
+    """Создать ядра масок сравнения {'gt': ..., 'lt': ...} для numba.
+
+    Ядро f(values, target, out) записывает в out маску values > target
+    (или <), NaN даёт False. Цикл numba.prange с parallel=True делится
+    между ядрами CPU; numba импортируется только при вызове фабрики.
+    """
+    from numba import prange
+
+    def gt_mask(values, target, out):
+        for i in prange(values.shape[0]):
+            out[i] = values[i] > target
+
+    def lt_mask(values, target, out):
+        for i in prange(values.shape[0]):
+            out[i] = values[i] < target
+
+    return {'gt': gt_mask, 'lt': lt_mask}
+
+
+_compiled_kernels: Dict[Tuple[Callable, bool], Callable] = {}
+
+# Ядра масок из _nb_mask_kernels, созданные при первом обращении
+_mask_kernels: Dict[str, Callable] = {}
+
+# Пул потоков numba workqueue не допускает одновременных параллельных вызовов
+# из разных потоков, например из map_chunks, поэтому вызовы идут по очереди.
+# Слой потоков выбирает пользователь (NUMBA_THREADING_LAYER); с TBB процесс
+# зависает при завершении, если первый параллельный вызов был сделан не из
+# главного потока
+_parallel_lock = threading.Lock()
+
+
+def _compiled(kernel: Callable, parallel: bool = False) -> Optional[Callable]:
+    """Вернуть версию ядра, скомпилированную numba (компиляция при первом вызове).
+
+    С parallel=True циклы prange ядра выполняются на всех ядрах CPU.
+    Если numba установлена, но не импортируется (например, из-за
+    несовместимой версии NumPy), возвращается None, и вызывающий код, как и
+    все следующие вызовы, идёт путём NumPy.
+    """
+    global HAS_NUMBA
+
+    compiled = _compiled_kernels.get((kernel, parallel))
+    if compiled is None:
+        try:
+            from numba import njit
+        except ImportError:
+            HAS_NUMBA = False
+            return None
+        compiled = njit(cache=True, parallel=parallel)(kernel)
+        _compiled_kernels[(kernel, parallel)] = compiled
+    return compiled
+
+
+def _compiled_mask(operator: str) -> Optional[Callable]:
+    """Вернуть параллельное ядро маски для operator ('gt' или 'lt') или None без numba."""
+    global HAS_NUMBA
+
+    if not _mask_kernels:
+        try:
+            _mask_kernels.update(_nb_mask_kernels())
+        except ImportError:
+            HAS_NUMBA = False
+            return None
+    return _compiled(_mask_kernels[operator], parallel=True)
+
+
+def _numeric_mask(values: Union[np.ndarray, pd.Series], target: Any,
+                  operator: str, fallback: str) -> np.ndarray:
+    """Построить маску сравнения числовой колонки с target.
+
+    Нечисловые значения становятся NaN, а сравнение с NaN всегда False.
+    Большие колонки сравниваются параллельным ядром numba для operator,
+    остальные - функцией NumPy с именем fallback прямо в маску.
+    """
+    import numpy as np
+
+    target_f = _to_float(target)
+    if target_f is None:
+        return np.zeros(len(values), dtype=bool)
+
+    numbers = _numeric_array(values)
+    mask = np.empty(numbers.shape[0], dtype=np.bool_)
+    if HAS_NUMBA and numbers.shape[0] >= NUMBA_MIN_SIZE:
+        with _parallel_lock:
+            compiled = _compiled_mask(operator)
+            if compiled is not None:
+                compiled(numbers, target_f, mask)
+                return mask
+    getattr(np, fallback)(numbers, target_f, out=mask)
+    return mask
+
+
+def _reduce(values: Union[List[float], np.ndarray], kernel: Callable,
+            fallback: str) -> float:
+    """Свернуть непустой массив ядром numba или функцией NumPy с именем fallback."""
+    import numpy as np
+
+    array = np.asarray(values, dtype=np.float64)
+    if HAS_NUMBA and array.shape[0] >= NUMBA_MIN_SIZE:
+        compiled = _compiled(kernel)
+        if compiled is not None:
+            return float(compiled(array))
+    return float(getattr(np, fallback)(array))
 
 
-class FilterOperator(ABC):
-    """Абстрактный базовый класс для операторов фильтрации."""
+class RunningAggregate:
+    """Накопленное состояние агрегации при обработке файла по частям."""
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update(self, values: np.ndarray):
+        """Учесть очередную порцию числовых значений."""
+        import numpy as np
+
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.total += float(np.sum(values))
+        self.minimum = min(self.minimum, float(np.min(values)))
+        self.maximum = max(self.maximum, float(np.max(values)))
+
+    def result(self, function: str) -> float:
+        """Вернуть итог функции агрегации по накопленным значениям."""
+        if function not in ('avg', 'min', 'max'):
+            raise ValueError(f"Неподдерживаемая функция агрегации: {function}")
+        if self.count == 0:
+            return 0.0
+        if function == 'avg':
+            return self.total / self.count
+        if function == 'min':
+            return self.minimum
+        return self.maximum
+
+
+def _agg_avg(values: Union[List[float], np.ndarray]) -> float:
+    """Среднее значение, 0.0 для пустого набора."""
+    if len(values) == 0:
+        return 0.0
+    return _reduce(values, _nb_mean, 'mean')
+
+
+def _agg_min(values: Union[List[float], np.ndarray]) -> float:
+    """Минимальное значение, 0.0 для пустого набора."""
+    if len(values) == 0:
+        return 0.0
+    return _reduce(values, _nb_min, 'min')
+
+
+def _agg_max(values: Union[List[float], np.ndarray]) -> float:
+    """Максимальное значение, 0.0 для пустого набора."""
+    if len(values) == 0:
+        return 0.0
+    return _reduce(values, _nb_max, 'max')
+
+
+# Встроенные операторы и функции агрегации. Для них есть специализированные
+# пути: индекс равенства, предикаты строк, агрегация по частям в CLI.
+# Операторы и функции, добавленные или заменённые в таблицах CSVProcessor,
+# всегда вызываются через таблицу
+_BUILTIN_OPERATORS = MappingProxyType({
+    'eq': _op_eq,
+    'gt': _op_gt,
+    'lt': _op_lt
+})
+
+_BUILTIN_AGGREGATIONS = MappingProxyType({
+    'avg': _agg_avg,
+    'min': _agg_min,
+    'max': _agg_max
+})
+
+
+class FilterOperator:
+    """Прежний интерфейс оператора фильтрации поверх функции из таблицы операторов.
+
+    Оставлен для совместимости с кодом, который импортирует классы
+    операторов. Новый код использует CSVProcessor.operators.
+    """
+
+    __slots__ = ()
+
+    function: Callable = None
 
-    @abstractmethod
     def apply(self, value: Any, target: Any) -> bool:
-        """Применить оператор фильтрации."""
-        pass
+        """Применить оператор фильтрации к одному значению."""
+        import numpy as np
+
+        return bool(self.function(np.array([value], dtype=object), target)[0])
 
 
 class EqualsOperator(FilterOperator):
-    """Оператор равенства."""
+    """Оператор равенства (без учёта регистра)."""
 
-    def apply(self, value: Any, target: Any) -> bool:
-        return str(value).lower() == str(target).lower()
+    __slots__ = ()
+    function = staticmethod(_op_eq)
 
 
 class GreaterOperator(FilterOperator):
     """Оператор больше."""
 
-    def apply(self, value: Any, target: Any) -> bool:
-        try:
-            return float(value) > float(target)
-        except (ValueError, TypeError):
-            return False
+    __slots__ = ()
+    function = staticmethod(_op_gt)
 
 
 class LessOperator(FilterOperator):
     """Оператор меньше."""
 
-    def apply(self, value: Any, target: Any) -> bool:
-        try:
-            return float(value) < float(target)
-        except (ValueError, TypeError):
-            return False
+    __slots__ = ()
+    function = staticmethod(_op_lt)
+
+
+class AggregationFunction:
+    """Прежний интерфейс функции агрегации поверх функции из таблицы агрегаций.
+
+    Оставлен для совместимости с кодом, который импортирует классы функций.
+    Новый код использует CSVProcessor.aggregation_functions.
+    """
 
+    __slots__ = ()
 
-class AggregationFunction(ABC):
-    """Абстрактный базовый класс для функций агрегации."""
+    function: Callable = None
 
-    @abstractmethod
-    def calculate(self, values: List[float]) -> float:
+    def calculate(self, values: Union[List[float], np.ndarray]) -> float:
         """Вычислить результат агрегации."""
-        pass
+        return self.function(values)
 
 
 class AverageFunction(AggregationFunction):
     """Функция вычисления среднего значения."""
 
-    def calculate(self, values: List[float]) -> float:
-        if not values:
-            return 0.0
-        return sum(values) / len(values)
+    __slots__ = ()
+    function = staticmethod(_agg_avg)
 
 
 class MinFunction(AggregationFunction):
     """Функция вычисления минимального значения."""
 
-    def calculate(self, values: List[float]) -> float:
-        if not values:
-            return 0.0
-        return min(values)
+    __slots__ = ()
+    function = staticmethod(_agg_min)
 
 
 class MaxFunction(AggregationFunction):
     """Функция вычисления максимального значения."""
 
-    def calculate(self, values: List[float]) -> float:
-        if not values:
-            return 0.0
-        return max(values)
+    __slots__ = ()
+    function = staticmethod(_agg_max)
+
+
+def _is_frame(data: Any) -> bool:
+    """Проверить, что data - DataFrame, не импортируя pandas без необходимости.
+
+    Если pandas ещё не импортирован, DataFrame существовать не может.
+    """
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(data, pd.DataFrame)
+
+
+def _is_columns(data: Any) -> bool:
+    """Проверить, что data - словарь колонок {имя: массив значений}."""
+    return isinstance(data, dict)
+
+
+def _row_count(data: Data) -> int:
+    """Вернуть число строк для любого поддерживаемого вида данных."""
+    if _is_columns(data):
+        return len(next(iter(data.values()), ()))
+    return len(data)
+
+
+def _column_names(data: Data, headers: Optional[List[str]] = None):
+    """Вернуть имена колонок для DataFrame, словаря колонок, списка словарей или строк."""
+    if headers is not None:
+        return headers
+    if _is_frame(data) or _is_columns(data):
+        return data.keys()
+    return data[0].keys()
+
+
+def _column_values(data: Data, column: str,
+                   headers: Optional[List[str]] = None) -> Union[np.ndarray, pd.Series]:
+    """Извлечь значения колонки.
+
+    Для DataFrame возвращается сама колонка (Series) без копирования в массив
+    объектов: строки в памяти Arrow передаются в pyarrow как есть. Для строк
+    без словарей позиция колонки определяется по заголовкам один раз.
+    """
+    import numpy as np
+
+    if _is_frame(data) or _is_columns(data):
+        return data[column]
+    key = headers.index(column) if headers is not None else column
+    return np.fromiter((row[key] for row in data), dtype=object, count=len(data))
+
+
+def _take(data: Data, rows: Union[np.ndarray, List[int]]) -> Data:
+    """Выбрать строки по булевой маске или списку номеров, сохранив вид данных."""
+    import numpy as np
+
+    if _is_frame(data):
+        if isinstance(rows, list):
+            return data.iloc[rows]
+        return data[rows]
+    if _is_columns(data):
+        return {name: values[rows] for name, values in data.items()}
+    if not isinstance(rows, list):
+        rows = np.flatnonzero(rows)
+    return [data[i] for i in rows]
+
+
+def _fast_grid(rows: Iterable[Sequence[Any]], headers: List[str]) -> Iterator[str]:
+    """Сформировать строки таблицы в формате grid без tabulate.
+
+    Пустые значения (None) выводятся пустыми ячейками, как в tabulate.
+    """
+    cells = [['' if cell is None else str(cell) for cell in row] for row in rows]
+    if (any('\n' in header for header in headers)
+            or any('\n' in cell for row in cells for cell in row)):
+        yield from _multiline_grid(cells, headers)
+        return
+
+    widths = [max(len(header), max((len(row[i]) for row in cells), default=0))
+              for i, header in enumerate(headers)]
+
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+
+    def line(row: List[str]) -> str:
+        return '|' + '|'.join(f' {cell:<{width}} ' for cell, width in zip(row, widths)) + '|'
+
+    yield border
+    yield line(headers)
+    yield border.replace('-', '=')
+    for row in cells:
+        yield line(row)
+        yield border
+
+
+def _multiline_grid(cells: List[List[str]], headers: List[str]) -> Iterator[str]:
+    """Сформировать таблицу grid, в которой ячейки занимают несколько строк.
+
+    Ячейки CSV в кавычках могут содержать переводы строк. Как и в tabulate,
+    каждая строка текста ячейки выводится отдельной строкой таблицы, а
+    ширина колонки считается по самой длинной строке текста.
+    """
+    table = [[cell.splitlines() or [''] for cell in row] for row in [headers] + cells]
+    widths = [max(len(text) for row in table for text in row[i])
+              for i in range(len(headers))]
+
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+
+    def lines(row: List[List[str]]) -> Iterator[str]:
+        for k in range(max(map(len, row), default=1)):
+            yield '|' + '|'.join(f' {cell[k] if k < len(cell) else "":<{width}} '
+                                 for cell, width in zip(row, widths)) + '|'
+
+    yield border
+    yield from lines(table[0])
+    yield border.replace('-', '=')
+    for row in table[1:]:
+        yield from lines(row)
+        yield border
 
 
 class CSVProcessor:
     """Основной класс для обработки CSV файлов."""
 
     def __init__(self):
-        self.operators = {
-            'eq': EqualsOperator(),
-            'gt': GreaterOperator(),
-            'lt': LessOperator()
-        }
+        # Операторы строят булеву маску по колонке: f(values, target)
+        self.operators = dict(_BUILTIN_OPERATORS)
+
+        # Функции агрегации сворачивают массив чисел: f(values)
+        self.aggregation_functions = dict(_BUILTIN_AGGREGATIONS)
+
+        # Индексы для фильтров равенства: колонка -> {значение: номера строк}.
+        # Строятся для последних переданных в filter_data данных и
+        # сбрасываются, когда приходят другие данные
+        self._index_cache: Dict[Union[str, int], Dict[str, List[int]]] = {}
+        self._indexed_data = None
+        self._indexed_rows = 0
+        self._index_lock = threading.Lock()
+
+    def read_csv(self, filepath: str) -> pd.DataFrame:
+        """Читать CSV файл и возвращать DataFrame.
+
+        Значения читаются как строки без преобразования пустых ячеек в NaN,
+        поэтому фильтрация по равенству видит исходный текст ячеек. Если
+        установлен pyarrow, файл разбирается его многопоточным парсером,
+        иначе C-парсером pandas через memory map. Как и в csv.DictReader,
+        строки с лишними полями не считаются ошибкой: лишние ячейки
+        отбрасываются.
+        """
+        import pandas as pd
 
-        self.aggregation_functions = {
-            'avg': AverageFunction(),
-            'min': MinFunction(),
-            'max': MaxFunction()
-        }
+        try:
+            if os.path.getsize(filepath) == 0:
+                # Пустой файл нельзя отобразить в память
+                return pd.DataFrame()
+
+            if HAS_PYARROW:
+                try:
+                    return pd.read_csv(filepath, engine='pyarrow', **_READ_OPTIONS)
+                except pd.errors.ParserError:
+                    # Файлы, которые pyarrow не разбирает (например, из одних
+                    # пробелов или со строками длиннее заголовка), читаются
+                    # C-парсером с его обработкой ошибок
+                    pass
+            return pd.read_csv(filepath, memory_map=True,
+                               usecols=range(len(_read_header(filepath))), **_READ_OPTIONS)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Файл {filepath} не найден")
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except Exception as e:
+            raise Exception(f"Ошибка при чтении файла: {e}")
+
+    def read_rows(self, filepath: str) -> Tuple[List[str], List[List[str]]]:
+        """Читать CSV файл как заголовки и список строк без создания словарей.
+
+        Как и в csv.DictReader, пустые строки файла пропускаются. Каждая
+        строка приводится к числу заголовков: недостающие ячейки становятся
+        пустыми, лишние отбрасываются.
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8', newline='') as file:
+                reader = csv.reader(file)
+                headers = next(reader, [])
+                width = len(headers)
+                rows = []
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) != width:
+                        row = (row + [''] * width)[:width]
+                    rows.append(row)
+                return headers, rows
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Файл {filepath} не найден")
+        except Exception as e:
+            raise Exception(f"Ошибка при чтении файла: {e}")
+
+    def read_columns(self, filepath: str) -> Dict[str, np.ndarray]:
+        """Читать CSV файл в словарь колонок {имя: массив значений}.
 
-    def read_csv(self, filepath: str) -> List[Dict[str, Any]]:
-        """Читать CSV файл и возвращать список словарей."""
+        Строки транспонируются один раз при чтении, дальше фильтрация и
+        агрегация работают с непрерывными массивами колонок.
+        """
+        import numpy as np
+
+        # read_rows уже пропустил пустые строки и выровнял строки по заголовкам
+        headers, rows = self.read_rows(filepath)
+        columns = zip(*rows) if rows else [()] * len(headers)
+        return {header: np.array(values, dtype=object)
+                for header, values in zip(headers, columns)}
+
+    def iter_csv(self, filepath: str,
+                 chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Читать CSV файл частями по chunksize строк (по умолчанию CHUNK_SIZE).
+
+        Если установлен pyarrow, файл читается его потоковым парсером. Строки
+        другой длины, чем заголовок, pyarrow не разбирает: тогда остаток
+        файла дочитывает C-парсер pandas, пропуская уже выданные строки.
+        Лишние ячейки в строках длиннее заголовка отбрасываются, как в read_csv.
+        """
+        import pandas as pd
+
+        chunksize = chunksize or CHUNK_SIZE
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                return list(reader)
+            if os.path.getsize(filepath) == 0:
+                return
+            header = _read_header(filepath)
         except FileNotFoundError:
             raise FileNotFoundError(f"Файл {filepath} не найден")
         except Exception as e:
             raise Exception(f"Ошибка при чтении файла: {e}")
+        if not header:
+            return
+
+        done = 0
+        # Повторяющиеся имена колонок pandas переименовывает (a, a.1), а pyarrow нет
+        if HAS_PYARROW and len(set(header)) == len(header):
+            import pyarrow as pa
+
+            try:
+                for chunk in _arrow_chunks(filepath, header, chunksize):
+                    done += len(chunk)
+                    yield chunk
+                return
+            except pa.ArrowInvalid:
+                pass
+
+        try:
+            reader = pd.read_csv(filepath, memory_map=True, chunksize=chunksize,
+                                 usecols=range(len(header)), **_READ_OPTIONS)
+        except pd.errors.EmptyDataError:
+            return
+        except Exception as e:
+            raise Exception(f"Ошибка при чтении файла: {e}")
 
-    def filter_data(self, data: List[Dict[str, Any]], column: str,
-                   operator: str, value: str) -> List[Dict[str, Any]]:
-        """Фильтровать данные по заданному условию."""
-        if column not in data[0]:
+        with reader:
+            for chunk in reader:
+                if done:
+                    skip = min(done, len(chunk))
+                    done -= skip
+                    chunk = chunk.iloc[skip:]
+                    if chunk.empty:
+                        continue
+                yield chunk
+
+    def map_chunks(self, func: Callable[[pd.DataFrame], Any],
+                   chunks: Iterable[pd.DataFrame],
+                   max_workers: Optional[int] = None) -> Iterator[Any]:
+        """Применить func к частям файла в пуле потоков, сохраняя порядок.
+
+        NumPy и pandas отпускают GIL во время векторных операций, поэтому части
+        обрабатываются параллельно. Одновременно в работе не больше
+        2 * max_workers частей: чтение следующей части ждёт, пока потребитель
+        не заберёт готовые результаты.
+        """
+        workers = max_workers or os.cpu_count() or 1
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunks:
+                pending.append(executor.submit(func, chunk))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def _check_filter(self, data: Data, column: str, operator: str,
+                      headers: Optional[List[str]] = None):
+        """Проверить, что колонка и оператор фильтра существуют."""
+        if column not in _column_names(data, headers):
             raise ValueError(f"Колонка '{column}' не найдена в данных")
 
         if operator not in self.operators:
             raise ValueError(f"Неподдерживаемый оператор: {operator}")
 
-        filter_op = self.operators[operator]
-        filtered_data = []
+    def filter_mask(self, data: Data, column: str, operator: str, value: str,
+                    headers: Optional[List[str]] = None) -> np.ndarray:
+        """Вернуть булеву маску строк, удовлетворяющих условию фильтрации."""
+        self._check_filter(data, column, operator, headers)
+
+        return self.operators[operator](_column_values(data, column, headers), value)
+
+    def filter_data(self, data: Data, column: str, operator: str, value: str,
+                    headers: Optional[List[str]] = None) -> Data:
+        """Фильтровать данные по заданному условию.
 
-        for row in data:
-            if filter_op.apply(row[column], value):
-                filtered_data.append(row)
+        headers передаются для строк-списков из read_rows.
 
-        return filtered_data
+        Для оператора eq по колонке один раз строится индекс значений, и
+        повторные фильтры по тем же данным выбирают строки без просмотра
+        всей колонки. Индекс рассчитан на то, что данные не изменяются на
+        месте; после изменения вызовите clear_index_cache.
 
-    def aggregate_data(self, data: List[Dict[str, Any]], column: str,
-                      function: str) -> float:
-        """Агрегировать данные по заданной функции."""
-        if not data:
+        Индекс и предикаты строк используются только для встроенных
+        операторов; остальные операторы из self.operators строят маску.
+        """
+        self._check_filter(data, column, operator, headers)
+        builtin = self.operators[operator] is _BUILTIN_OPERATORS.get(operator)
+        key = headers.index(column) if headers is not None else column
+
+        if builtin and operator == 'eq':
+            positions = self._eq_index(data, column, key, headers).get(
+                str(value).casefold(), [])
+            return _take(data, positions)
+
+        if not builtin or _is_frame(data) or _is_columns(data):
+            return _take(data, self.filter_mask(data, column, operator, value, headers))
+
+        # Для списков строк один специализированный предикат быстрее, чем
+        # сборка колонки в массив и выборка по маске
+        predicate = build_predicate(key, operator, value)
+        return [row for row in data if predicate(row)]
+
+    def _eq_index(self, data: Data, column: str, key: Union[str, int],
+                  headers: Optional[List[str]] = None) -> Dict[str, List[int]]:
+        """Вернуть индекс значение -> номера строк для колонки, построив его при необходимости."""
+        with self._index_lock:
+            rows = _row_count(data)
+            if data is not self._indexed_data or rows != self._indexed_rows:
+                self.clear_index_cache()
+                self._indexed_data = data
+                self._indexed_rows = rows
+
+            index = self._index_cache.get(key)
+            if index is None:
+                index = defaultdict(list)
+                values = _column_values(data, column, headers)
+                if _is_frame(data):
+                    values = values.to_numpy(dtype=object)
+                for i, value in enumerate(values):
+                    index[str(value).casefold()].append(i)
+                index = self._index_cache[key] = dict(index)
+            return index
+
+    def clear_index_cache(self):
+        """Сбросить индексы фильтров равенства."""
+        self._index_cache = {}
+        self._indexed_data = None
+        self._indexed_rows = 0
+
+    def aggregate_data(self, data: Data, column: str, function: str,
+                       headers: Optional[List[str]] = None) -> float:
+        """Агрегировать данные по заданной функции.
+
+        headers передаются для строк-списков из read_rows.
+        """
+        if _row_count(data) == 0:
             return 0.0
 
-        if column not in data[0]:
+        if column not in _column_names(data, headers):
             raise ValueError(f"Колонка '{column}' не найдена в данных")
 
         if function not in self.aggregation_functions:
             raise ValueError(f"Неподдерживаемая функция агрегации: {function}")
 
-        # Извлекаем числовые значения
-        numeric_values = []
-        for row in data:
-            try:
-                numeric_values.append(float(row[column]))
-            except (ValueError, TypeError):
-                # Пропускаем нечисловые значения
-                continue
+        # Извлекаем числовые значения одним векторным преобразованием
+        # в массив float64, нечисловые значения пропускаются
+        numeric_values = self.numeric_values(data, column, headers=headers)
 
-        if not numeric_values:
+        if len(numeric_values) == 0:
             raise ValueError(f"В колонке '{column}' нет числовых значений для агрегации")
 
-        agg_func = self.aggregation_functions[function]
-        return agg_func.calculate(numeric_values)
+        return self.aggregation_functions[function](numeric_values)
+
+    def filter_and_aggregate(self, data: Data, filter_column: str, operator: str,
+                             value: str, agg_column: str, function: str,
+                             headers: Optional[List[str]] = None) -> float:
+        """Отфильтровать и агрегировать данные за один проход.
+
+        В отличие от filter_data + aggregate_data промежуточная таблица не
+        создаётся: маска фильтра применяется сразу к агрегируемой колонке.
+        """
+        if _row_count(data) == 0:
+            return 0.0
+
+        if function not in self.aggregation_functions:
+            raise ValueError(f"Неподдерживаемая функция агрегации: {function}")
+
+        mask = self.filter_mask(data, filter_column, operator, value, headers)
+        if not mask.any():
+            return 0.0
+
+        numeric_values = self.numeric_values(data, agg_column, mask, headers)
+        if len(numeric_values) == 0:
+            raise ValueError(f"В колонке '{agg_column}' нет числовых значений для агрегации")
+
+        return self.aggregation_functions[function](numeric_values)
+
+    def numeric_values(self, data: Data, column: str,
+                       mask: Optional[np.ndarray] = None,
+                       headers: Optional[List[str]] = None) -> np.ndarray:
+        """Вернуть числовые значения колонки, пропуская нечисловые.
+
+        Если передана mask, учитываются только отмеченные ею строки.
+        """
+        import numpy as np
+
+        if column not in _column_names(data, headers):
+            raise ValueError(f"Колонка '{column}' не найдена в данных")
+
+        values = _column_values(data, column, headers)
+        if mask is not None:
+            values = values[mask]
+
+        values = _numeric_array(values)
+        return values[~np.isnan(values)]
+
+    def display_table(self, data: Data, headers: Optional[List[str]] = None):
+        """Отобразить данные в виде таблицы.
 
-    def display_table(self, data: List[Dict[str, Any]], headers: Optional[List[str]] = None):
-        """Отобразить данные в виде таблицы."""
-        if not data:
+        Для строк-списков из read_rows headers обязательны.
+        """
+        rows = _row_count(data)
+        if rows == 0:
             print("Нет данных для отображения")
             return
 
         if headers is None:
-            headers = list(data[0].keys())
-
-        table_data = []
-        for row in data:
-            table_data.append([row.get(header, '') for header in headers])
+            headers = list(_column_names(data))
+
+        if _is_frame(data) or _is_columns(data):
+            # Строки собираются из колонок по мере вывода
+            columns = [data[header] if header in data else [''] * rows
+                       for header in headers]
+            table_data = zip(*columns)
+        elif not isinstance(data[0], dict):
+            # Строки из read_rows уже упорядочены по заголовкам, поэтому
+            # заголовки должны описывать все колонки строки
+            if len(headers) != len(data[0]):
+                raise ValueError(f"Число заголовков ({len(headers)}) не совпадает "
+                                 f"с числом колонок ({len(data[0])})")
+            table_data = data
+        else:
+            table_data = []
+            for row in data:
+                table_data.append([row.get(header, '') for header in headers])
 
-        print(tabulate(table_data, headers=headers, tablefmt='grid'))
+        lines = _fast_grid(table_data, headers)
+        if rows > STREAM_OUTPUT_ROWS:
+            sys.stdout.writelines(f"{line}\n" for line in lines)
+        else:
+            print('\n'.join(lines))
 
     def display_aggregation_result(self, column: str, function: str, result: float):
         """Отобразить результат агрегации."""
+        from tabulate import tabulate
+
         function_names = {
             'avg': 'Среднее',
             'min': 'Минимум',
@@ -190,28 +1000,16 @@ def parse_filter(filter_str: str) -> tuple:
     if not filter_str:
         return None, None, None
 
-    parts = filter_str.split('=')
-    if len(parts) != 3:
+    column, sep, rest = filter_str.partition('=')
+    operator, op_sep, value = rest.partition('=')
+    if not sep or not op_sep or '=' in value:
         raise ValueError("Фильтр должен быть в формате: column=operator=value")
 
-    column, operator, value = parts
-
     # Преобразуем операторы в внутренний формат
-    operator_map = {
-        '==': 'eq',
-        'eq': 'eq',
-        '>': 'gt',
-        'gt': 'gt',
-        '>=': 'gt',
-        '<': 'lt',
-        'lt': 'lt',
-        '<=': 'lt'
-    }
-
-    if operator not in operator_map:
+    if operator not in _OPERATOR_MAP:
         raise ValueError(f"Неподдерживаемый оператор: {operator}")
 
-    return column.strip(), operator_map[operator], value.strip()
+    return column.strip(), _OPERATOR_MAP[operator], value.strip()
 
 
 def parse_aggregation(agg_str: str) -> tuple:
@@ -219,11 +1017,10 @@ def parse_aggregation(agg_str: str) -> tuple:
     if not agg_str:
         return None, None
 
-    parts = agg_str.split('=')
-    if len(parts) != 2:
+    column, sep, function = agg_str.partition('=')
+    if not sep or '=' in function:
         raise ValueError("Агрегация должна быть в формате: column=function")
 
-    column, function = parts
     return column.strip(), function.strip().lower()
 
 
@@ -251,30 +1048,77 @@ def main():
     processor = CSVProcessor()
 
     try:
-        # Читаем данные
-        data = processor.read_csv(args.file)
-
-        if not data:
+        filter_args = parse_filter(args.filter) if args.filter else None
+        agg_args = parse_aggregation(args.aggregate) if args.aggregate else None
+
+        if agg_args and agg_args[1] not in processor.aggregation_functions:
+            raise ValueError(f"Неподдерживаемая функция агрегации: {agg_args[1]}")
+
+        # Встроенные функции считаются по частям в RunningAggregate. Функция,
+        # добавленная или заменённая в таблице, получает все значения сразу
+        streaming = bool(agg_args) and (processor.aggregation_functions[agg_args[1]]
+                                        is _BUILTIN_AGGREGATIONS.get(agg_args[1]))
+
+        def process_chunk(chunk: pd.DataFrame):
+            rows = len(chunk)
+            mask = processor.filter_mask(chunk, *filter_args) if filter_args else None
+
+            if agg_args:
+                # Фильтр и агрегация за один проход, без промежуточной таблицы
+                matched = rows if mask is None else int(mask.sum())
+                return rows, matched, processor.numeric_values(chunk, agg_args[0], mask)
+
+            if mask is not None:
+                chunk = chunk[mask]
+            return rows, len(chunk), chunk
+
+        # Читаем файл по частям: каждая часть фильтруется в пуле потоков и сразу
+        # учитывается в агрегации, поэтому весь файл не держится в памяти
+        total_rows = 0
+        matched_rows = 0
+        state = RunningAggregate()
+        parts = []
+
+        chunks = processor.iter_csv(args.file)
+        for rows, matched, result in processor.map_chunks(process_chunk, chunks):
+            total_rows += rows
+            matched_rows += matched
+
+            if streaming:
+                state.update(result)
+            else:
+                parts.append(result)
+
+        if total_rows == 0:
             print("CSV файл пустой")
             return
 
-        # Применяем фильтрацию если указана
-        if args.filter:
-            column, operator, value = parse_filter(args.filter)
-            data = processor.filter_data(data, column, operator, value)
-
-            if not data:
-                print("Нет данных, соответствующих условию фильтрации")
-                return
+        if matched_rows == 0:
+            print("Нет данных, соответствующих условию фильтрации")
+            return
 
         # Выполняем агрегацию если указана
-        if args.aggregate:
-            column, function = parse_aggregation(args.aggregate)
-            result = processor.aggregate_data(data, column, function)
+        if agg_args:
+            column, function = agg_args
+            if streaming:
+                count = state.count
+            else:
+                import numpy as np
+                values = np.concatenate(parts)
+                count = len(values)
+
+            if count == 0:
+                raise ValueError(f"В колонке '{column}' нет числовых значений для агрегации")
+
+            if streaming:
+                result = state.result(function)
+            else:
+                result = processor.aggregation_functions[function](values)
             processor.display_aggregation_result(column, function, result)
         else:
             # Отображаем отфильтрованные данные
-            processor.display_table(data)
+            import pandas as pd
+            processor.display_table(pd.concat(parts, ignore_index=True))
 
     except Exception as e:
         print(f"Ошибка: {e}", file=sys.stderr)
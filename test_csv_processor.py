@@ -1,7 +1,12 @@
 import pytest
+import subprocess
+import sys
 import tempfile
 import os
+import numpy as np
+import pandas as pd
 from unittest.mock import patch, mock_open
+import csv_processor
 from csv_processor import (
     CSVProcessor,
     EqualsOperator,
@@ -10,14 +15,236 @@ from csv_processor import (
     AverageFunction,
     MinFunction,
     MaxFunction,
+    RunningAggregate,
+    build_predicate,
     parse_filter,
-    parse_aggregation
+    parse_aggregation,
+    main
 )
 
+requires_pyarrow = pytest.mark.skipif(not csv_processor.HAS_PYARROW,
+                                      reason='pyarrow не установлен')
+requires_numba = pytest.mark.skipif(not csv_processor.HAS_NUMBA,
+                                    reason='numba не установлена')
+
 
 class TestFilterOperators:
     """Тесты для операторов фильтрации."""
 
+    @pytest.fixture
+    def operators(self):
+        return CSVProcessor().operators
+
+    @staticmethod
+    def check(op, value, target):
+        return bool(op(np.array([value], dtype=object), target)[0])
+
+    def test_equals_operator(self, operators):
+        op = operators['eq']
+        assert self.check(op, "apple", "apple") is True
+        assert self.check(op, "Apple", "apple") is True  # case insensitive
+        assert self.check(op, "apple", "samsung") is False
+        assert self.check(op, "123", "123") is True
+        assert self.check(op, "STRASSE", "straße") is True
+
+    def test_greater_operator(self, operators):
+        op = operators['gt']
+        assert self.check(op, "10", "5") is True
+        assert self.check(op, "5", "10") is False
+        assert self.check(op, "10.5", "10") is True
+        assert self.check(op, "not_a_number", "5") is False
+        assert self.check(op, "5", "not_a_number") is False
+
+    def test_less_operator(self, operators):
+        op = operators['lt']
+        assert self.check(op, "5", "10") is True
+        assert self.check(op, "10", "5") is False
+        assert self.check(op, "9.5", "10") is True
+        assert self.check(op, "not_a_number", "5") is False
+        assert self.check(op, "5", "not_a_number") is False
+
+    def test_operators_on_column(self, operators):
+        values = np.array(["Apple", "10", "not_a_number", 3.5], dtype=object)
+        assert operators['eq'](values, "apple").tolist() == [True, False, False, False]
+        assert operators['gt'](values, "5").tolist() == [False, True, False, False]
+        assert operators['lt'](values, "5").tolist() == [False, False, False, True]
+        assert operators['lt'](values, "not_a_number").tolist() == [False] * 4
+
+    @pytest.mark.parametrize('use_pyarrow', [
+        pytest.param(True, marks=requires_pyarrow),
+        False,
+    ])
+    def test_numeric_array(self, use_pyarrow, monkeypatch):
+        monkeypatch.setattr(csv_processor, 'HAS_PYARROW', use_pyarrow)
+        convert = csv_processor._numeric_array
+
+        clean = convert(np.array(['1', ' 2.5 ', '-3e1', '.5'], dtype=object))
+        assert clean.tolist() == [1.0, 2.5, -30.0, 0.5]
+
+        dirty = convert(pd.Series(['10', 'n/a', '', None, '1.2.3', 'inf'], dtype=str))
+        assert dirty[0] == 10.0
+        assert np.isnan(dirty[1:5]).all()
+        assert dirty[5] == np.inf
+
+        mixed = convert(np.array([1, '2', 3.5, None], dtype=object))
+        assert mixed[:3].tolist() == [1.0, 2.0, 3.5]
+        assert np.isnan(mixed[3])
+
+    @requires_numba
+    @pytest.mark.parametrize('compiled', [True, False])
+    def test_mask_kernels(self, compiled):
+        kernels = csv_processor._nb_mask_kernels()
+
+        def kernel(operator):
+            return csv_processor._compiled_mask(operator) if compiled else kernels[operator]
+
+        values = np.array([1.0, np.nan, 7.0, 5.0])
+        out = np.empty(4, dtype=np.bool_)
+        kernel('gt')(values, 5.0, out)
+        assert out.tolist() == [False, False, True, False]
+        kernel('lt')(values, 5.0, out)
+        assert out.tolist() == [True, False, False, False]
+
+    def test_large_numeric_filter(self):
+        operators = CSVProcessor().operators
+        values = np.arange(csv_processor.NUMBA_MIN_SIZE, dtype=np.float64).astype(str).astype(object)
+        values[0] = 'n/a'
+        greater = operators['gt'](values, '99990')
+        assert np.flatnonzero(greater).tolist() == list(range(99991, csv_processor.NUMBA_MIN_SIZE))
+        assert operators['lt'](values, '3').sum() == 2
+
+    def test_build_predicate(self):
+        assert build_predicate('brand', 'eq', 'Apple')({'brand': 'APPLE'}) is True
+        assert build_predicate(1, 'eq', 'apple')(['x', 'samsung']) is False
+
+        greater = build_predicate('price', 'gt', '500')
+        assert [greater({'price': p}) for p in ('999', '100', 'n/a', None)] == [True, False, False, False]
+
+        less = build_predicate(0, 'lt', '500')
+        assert [less([p]) for p in ('999', '100', 'n/a')] == [False, True, False]
+        assert [less([p]) for p in ('n/a', '', '7', 'n/a')] == [False, False, True, False]
+
+        assert build_predicate('price', 'lt', 'not_a_number')({'price': '1'}) is False
+        with pytest.raises(ValueError, match="Неподдерживаемый оператор"):
+            build_predicate('price', 'ne', '1')
+
+    def test_build_predicate_rejected_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(csv_processor, 'REJECTED_CACHE_SIZE', 2)
+        greater = build_predicate('price', 'gt', '0')
+        rows = [{'price': p} for p in ('a', 'b', 'c', 'd', '5', 'a', 'b', 'c', 'd')]
+        assert [greater(row) for row in rows[:5]] == [False] * 4 + [True]
+
+        # Запомнены только первые два значения: 'a' и 'b' больше не
+        # преобразуются, 'c' и 'd' снова проходят через float
+        converted = []
+
+        def counting_float(value):
+            converted.append(value)
+            return float(value)
+
+        monkeypatch.setattr(csv_processor, 'float', counting_float, raising=False)
+        assert [greater(row) for row in rows[5:]] == [False] * 4
+        assert converted == ['c', 'd']
+
+    def test_build_predicate_unhashable_values(self):
+        assert build_predicate('x', 'gt', '1')({'x': [1]}) is False
+        assert build_predicate('x', 'lt', '1')({'x': {'a': 1}}) is False
+        assert CSVProcessor().filter_data([{'x': [1]}, {'x': '2'}], 'x', 'gt', '1') == [{'x': '2'}]
+
+
+class TestAggregationFunctions:
+    """Тесты для функций агрегации."""
+
+    @pytest.fixture
+    def functions(self):
+        return CSVProcessor().aggregation_functions
+
+    def test_average_function(self, functions):
+        func = functions['avg']
+        assert func([1, 2, 3, 4, 5]) == 3.0
+        assert func([10.5, 20.5]) == 15.5
+        assert func([]) == 0.0
+        assert func([42]) == 42.0
+
+    def test_min_function(self, functions):
+        func = functions['min']
+        assert func([1, 2, 3, 4, 5]) == 1
+        assert func([10.5, 5.2, 20.8]) == 5.2
+        assert func([]) == 0.0
+        assert func([42]) == 42
+
+    def test_max_function(self, functions):
+        func = functions['max']
+        assert func([1, 2, 3, 4, 5]) == 5
+        assert func([10.5, 5.2, 20.8]) == 20.8
+        assert func([]) == 0.0
+        assert func([42]) == 42
+
+    @pytest.mark.parametrize('compiled', [
+        pytest.param(True, marks=requires_numba),
+        False,
+    ])
+    def test_numba_kernels(self, compiled):
+        def kernel(func):
+            return csv_processor._compiled(func) if compiled else func
+
+        values = np.array([3.0, -1.5, 7.25, 0.0])
+        assert kernel(csv_processor._nb_mean)(values) == pytest.approx(np.mean(values))
+        assert kernel(csv_processor._nb_min)(values) == -1.5
+        assert kernel(csv_processor._nb_max)(values) == 7.25
+
+    def test_large_input_uses_same_results(self, functions):
+        values = np.arange(csv_processor.NUMBA_MIN_SIZE, dtype=np.float64)
+        assert functions['avg'](values) == pytest.approx(values.mean())
+        assert functions['min'](values) == 0.0
+        assert functions['max'](values) == values[-1]
+
+    def test_broken_numba_falls_back_to_numpy(self, functions, monkeypatch):
+        # numba установлена, но её импорт падает
+        monkeypatch.setitem(sys.modules, 'numba', None)
+        monkeypatch.setattr(csv_processor, 'HAS_NUMBA', True)
+        monkeypatch.setattr(csv_processor, '_compiled_kernels', {})
+        monkeypatch.setattr(csv_processor, '_mask_kernels', {})
+
+        # Без numba ядра на Python не запускаются даже при первом вызове
+        def kernel_not_expected(*args):
+            raise AssertionError('ядро не должно вызываться без numba')
+
+        for name in ('_nb_mean', '_nb_max'):
+            monkeypatch.setattr(csv_processor, name, kernel_not_expected)
+
+        values = np.arange(2 * csv_processor.NUMBA_MIN_SIZE, dtype=np.float64)
+        assert functions['avg'](values) == pytest.approx(values.mean())
+        assert csv_processor.HAS_NUMBA is False
+        assert functions['max'](values) == values[-1]
+
+        monkeypatch.setattr(csv_processor, 'HAS_NUMBA', True)
+        mask = CSVProcessor().operators['gt'](values, '10')
+        assert mask.sum() == len(values) - 11
+        assert csv_processor.HAS_NUMBA is False
+
+    def test_running_aggregate_has_no_instance_dict(self):
+        assert not hasattr(RunningAggregate(), '__dict__')
+
+    def test_running_aggregate_result(self):
+        state = RunningAggregate()
+        assert state.result('avg') == 0.0
+        assert state.result('min') == 0.0
+        assert state.result('max') == 0.0
+        with pytest.raises(ValueError, match="Неподдерживаемая функция агрегации"):
+            state.result('sum')
+
+        state.update(np.array([1.0, 5.0]))
+        state.update(np.array([]))
+        state.update(np.array([3.0, -2.0, 8.0]))
+        assert state.result('avg') == 3.0
+        assert state.result('min') == -2.0
+        assert state.result('max') == 8.0
+
+
+class TestCompatibilityClasses:
+    """Тесты прежних классов операторов и функций агрегации."""
+
     def test_equals_operator(self):
         op = EqualsOperator()
         assert op.apply("apple", "apple") is True
@@ -41,10 +268,6 @@ class TestFilterOperators:
         assert op.apply("not_a_number", "5") is False
         assert op.apply("5", "not_a_number") is False
 
-
-class TestAggregationFunctions:
-    """Тесты для функций агрегации."""
-
     def test_average_function(self):
         func = AverageFunction()
         assert func.calculate([1, 2, 3, 4, 5]) == 3.0
@@ -83,8 +306,13 @@ class TestCSVProcessor:
             {'name': 'poco x5 pro', 'brand': 'xiaomi', 'price': '299', 'rating': '4.4'}
         ]
 
-    def test_read_csv_success(self, processor):
-        csv_content = "name,brand,price,rating\niphone 15 pro,apple,999,4.9\ngalaxy s23,samsung,800,4.7"
+    @pytest.mark.parametrize('use_pyarrow', [
+        pytest.param(True, marks=requires_pyarrow),
+        False,
+    ])
+    def test_read_csv_success(self, processor, use_pyarrow, monkeypatch):
+        monkeypatch.setattr(csv_processor, 'HAS_PYARROW', use_pyarrow)
+        csv_content = "name,brand,price,rating\niphone 15 pro,apple,999,4.9\ngalaxy s23,samsung,800,4.7,extra"
 
         with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
             f.write(csv_content)
@@ -92,10 +320,13 @@ class TestCSVProcessor:
 
         try:
             data = processor.read_csv(temp_path)
+            assert isinstance(data, pd.DataFrame)
             assert len(data) == 2
-            assert data[0]['name'] == 'iphone 15 pro'
-            assert data[0]['brand'] == 'apple'
-            assert data[1]['name'] == 'galaxy s23'
+            assert data.iloc[0]['name'] == 'iphone 15 pro'
+            assert data.iloc[0]['brand'] == 'apple'
+            assert data.iloc[1]['name'] == 'galaxy s23'
+            assert data.iloc[0]['price'] == '999'
+            assert list(data.columns) == ['name', 'brand', 'price', 'rating']
         finally:
             os.unlink(temp_path)
 
@@ -103,11 +334,78 @@ class TestCSVProcessor:
         with pytest.raises(FileNotFoundError):
             processor.read_csv('nonexistent_file.csv')
 
+    @pytest.mark.parametrize('use_pyarrow', [
+        pytest.param(True, marks=requires_pyarrow),
+        False,
+    ])
+    @pytest.mark.parametrize('content', ['', '\n\n'])
+    def test_read_csv_empty_file(self, processor, use_pyarrow, content, monkeypatch):
+        monkeypatch.setattr(csv_processor, 'HAS_PYARROW', use_pyarrow)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+            f.write(content)
+            temp_path = f.name
+
+        try:
+            data = processor.read_csv(temp_path)
+            assert len(data) == 0
+        finally:
+            os.unlink(temp_path)
+
+    def test_filter_dataframe_equals(self, processor, sample_data):
+        df = pd.DataFrame(sample_data)
+        result = processor.filter_data(df, 'brand', 'eq', 'XIAOMI')
+        assert isinstance(result, pd.DataFrame)
+        assert list(result['name']) == ['redmi note 12', 'poco x5 pro']
+
+    def test_filter_dataframe_numeric(self, processor, sample_data):
+        df = pd.DataFrame(sample_data)
+        assert list(processor.filter_data(df, 'price', 'gt', '500')['price']) == ['999', '1199']
+        assert list(processor.filter_data(df, 'price', 'lt', '500')['price']) == ['199', '299']
+        assert len(processor.filter_data(df, 'price', 'gt', 'not_a_number')) == 0
+        assert len(processor.filter_data(df, 'name', 'gt', '0')) == 0
+
+    def test_aggregate_dataframe(self, processor, sample_data):
+        df = pd.DataFrame(sample_data)
+        assert processor.aggregate_data(df, 'price', 'avg') == (999 + 1199 + 199 + 299) / 4
+        assert processor.aggregate_data(df, 'rating', 'min') == 4.4
+        assert processor.aggregate_data(df, 'rating', 'max') == 4.9
+        with pytest.raises(ValueError, match="нет числовых значений для агрегации"):
+            processor.aggregate_data(df, 'name', 'avg')
+
     def test_filter_data_equals(self, processor, sample_data):
         result = processor.filter_data(sample_data, 'brand', 'eq', 'xiaomi')
         assert len(result) == 2
         assert all(row['brand'] == 'xiaomi' for row in result)
 
+    def test_filter_data_equals_reuses_index(self, processor, sample_data):
+        assert len(processor.filter_data(sample_data, 'brand', 'eq', 'xiaomi')) == 2
+        assert list(processor._index_cache) == ['brand']
+
+        with patch('csv_processor._column_values') as column_values:
+            result = processor.filter_data(sample_data, 'brand', 'eq', 'Apple')
+        column_values.assert_not_called()
+        assert [row['name'] for row in result] == ['iphone 15 pro']
+        assert processor.filter_data(sample_data, 'brand', 'eq', 'nokia') == []
+
+    def test_filter_data_equals_index_invalidation(self, processor, sample_data):
+        processor.filter_data(sample_data, 'brand', 'eq', 'xiaomi')
+
+        sample_data.append({'name': 'mi 13', 'brand': 'xiaomi', 'price': '599', 'rating': '4.7'})
+        assert len(processor.filter_data(sample_data, 'brand', 'eq', 'xiaomi')) == 3
+
+        other = sample_data[:1]
+        assert len(processor.filter_data(other, 'brand', 'eq', 'xiaomi')) == 0
+
+        sample_data[0]['brand'] = 'xiaomi'
+        processor.clear_index_cache()
+        assert len(processor.filter_data(sample_data, 'brand', 'eq', 'xiaomi')) == 4
+
+    def test_filter_dataframe_equals_uses_index(self, processor, sample_data):
+        df = pd.DataFrame(sample_data)
+        result = processor.filter_data(df, 'brand', 'eq', 'samsung')
+        assert list(result['name']) == ['galaxy s23 ultra']
+        assert list(processor.filter_data(df, 'brand', 'eq', 'XIAOMI').index) == [2, 3]
+
     def test_filter_data_greater(self, processor, sample_data):
         result = processor.filter_data(sample_data, 'price', 'gt', '500')
         assert len(result) == 2
@@ -126,6 +424,21 @@ class TestCSVProcessor:
         with pytest.raises(ValueError, match="Неподдерживаемый оператор"):
             processor.filter_data(sample_data, 'brand', 'invalid_op', 'value')
 
+    def test_filter_data_uses_operator_table(self, processor, sample_data):
+        processor.operators['ne'] = lambda values, target: ~processor.operators['eq'](values, target)
+        headers = list(sample_data[0])
+        rows = [list(row.values()) for row in sample_data]
+        for data, kwargs in ((sample_data, {}), (rows, {'headers': headers}),
+                             (pd.DataFrame(sample_data), {})):
+            result = processor.filter_data(data, 'brand', 'ne', 'xiaomi', **kwargs)
+            assert len(result) == 2
+
+        # Заменённые встроенные операторы тоже применяются к спискам строк
+        processor.operators['gt'] = lambda values, target: np.ones(len(values), dtype=bool)
+        processor.operators['eq'] = lambda values, target: np.zeros(len(values), dtype=bool)
+        assert processor.filter_data(sample_data, 'price', 'gt', '100000') == sample_data
+        assert processor.filter_data(sample_data, 'brand', 'eq', 'apple') == []
+
     def test_aggregate_data_average(self, processor, sample_data):
         result = processor.aggregate_data(sample_data, 'price', 'avg')
         expected = (999 + 1199 + 199 + 299) / 4
@@ -151,6 +464,12 @@ class TestCSVProcessor:
         with pytest.raises(ValueError, match="Неподдерживаемая функция агрегации"):
             processor.aggregate_data(sample_data, 'price', 'invalid_func')
 
+    def test_aggregate_data_skips_non_numeric_values(self, processor, sample_data):
+        sample_data[0]['price'] = 'n/a'
+        sample_data[1]['price'] = ''
+        sample_data[2]['price'] = 200
+        assert processor.aggregate_data(sample_data, 'price', 'avg') == 249.5
+
     def test_aggregate_data_non_numeric_column(self, processor, sample_data):
         with pytest.raises(ValueError, match="нет числовых значений для агрегации"):
             processor.aggregate_data(sample_data, 'name', 'avg')
@@ -160,6 +479,53 @@ class TestCSVProcessor:
         processor.display_table(sample_data)
         mock_print.assert_called()
 
+    @patch('builtins.print')
+    def test_display_table_dataframe(self, mock_print, processor, sample_data):
+        processor.display_table(pd.DataFrame(sample_data))
+        output = mock_print.call_args[0][0]
+        assert 'galaxy s23 ultra' in output
+        assert '| name ' in output
+
+    @patch('builtins.print')
+    def test_display_table_grid(self, mock_print, processor):
+        processor.display_table([{'name': 'x', 'price': '10'}, {'name': 'long name', 'price': ''},
+                                 {'name': 'short', 'price': None}])
+        assert mock_print.call_args[0][0].splitlines() == [
+            '+-----------+-------+',
+            '| name      | price |',
+            '+===========+=======+',
+            '| x         | 10    |',
+            '+-----------+-------+',
+            '| long name |       |',
+            '+-----------+-------+',
+            '| short     |       |',
+            '+-----------+-------+',
+        ]
+
+    @patch('builtins.print')
+    def test_display_table_multiline_cells(self, mock_print, processor):
+        processor.display_table([{'name': 'a', 'note': 'line1\nlonger line2'},
+                                 {'name': 'bb', 'note': 'x'}])
+        assert mock_print.call_args[0][0].splitlines() == [
+            '+------+--------------+',
+            '| name | note         |',
+            '+======+==============+',
+            '| a    | line1        |',
+            '|      | longer line2 |',
+            '+------+--------------+',
+            '| bb   | x            |',
+            '+------+--------------+',
+        ]
+
+    def test_display_table_streams_large_output(self, processor, capsys):
+        rows = [{'id': str(i)} for i in range(csv_processor.STREAM_OUTPUT_ROWS + 1)]
+        with patch('builtins.print') as mock_print:
+            processor.display_table(rows)
+        mock_print.assert_not_called()
+        output = capsys.readouterr().out.splitlines()
+        assert output[1] == '| id   |'
+        assert len(output) == 3 + 2 * len(rows)
+
     @patch('builtins.print')
     def test_display_table_empty_data(self, mock_print, processor):
         processor.display_table([])
@@ -204,6 +570,10 @@ class TestParseFunctions:
     def test_parse_filter_invalid_format(self):
         with pytest.raises(ValueError, match="Фильтр должен быть в формате"):
             parse_filter("invalid_format")
+        with pytest.raises(ValueError, match="Фильтр должен быть в формате"):
+            parse_filter("price=gt")
+        with pytest.raises(ValueError, match="Фильтр должен быть в формате"):
+            parse_filter("price=gt=5=0")
 
     def test_parse_filter_invalid_operator(self):
         with pytest.raises(ValueError, match="Неподдерживаемый оператор"):
@@ -221,6 +591,8 @@ class TestParseFunctions:
     def test_parse_aggregation_invalid_format(self):
         with pytest.raises(ValueError, match="Агрегация должна быть в формате"):
             parse_aggregation("invalid_format")
+        with pytest.raises(ValueError, match="Агрегация должна быть в формате"):
+            parse_aggregation("price=avg=min")
 
     def test_parse_aggregation_case_insensitive(self):
         column, function = parse_aggregation("price=AVG")
@@ -228,6 +600,17 @@ class TestParseFunctions:
         assert function == "avg"
 
 
+class TestStartup:
+    """Тесты времени запуска."""
+
+    def test_import_does_not_load_heavy_dependencies(self):
+        code = ("import sys, csv_processor; "
+                "print(sorted(m for m in ('numpy', 'pandas', 'tabulate', 'numba') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        assert output.strip() == '[]'
+
+
 class TestIntegration:
     """Интеграционные тесты."""
 
@@ -262,6 +645,221 @@ poco x5 pro,xiaomi,299,4.4"""
         expected = (199 + 299) / 2
         assert result == expected
 
+    def test_read_rows_positional(self, csv_file, capsys):
+        processor = CSVProcessor()
+        headers, rows = processor.read_rows(csv_file)
+        assert headers == ['name', 'brand', 'price', 'rating']
+        assert rows[0] == ['iphone 15 pro', 'apple', '999', '4.9']
+
+        filtered = processor.filter_data(rows, 'brand', 'eq', 'xiaomi', headers=headers)
+        assert [row[0] for row in filtered] == ['redmi note 12', 'poco x5 pro']
+        assert processor.aggregate_data(filtered, 'price', 'max', headers=headers) == 299.0
+
+        processor.display_table(filtered, headers)
+        assert '| poco x5 pro ' in capsys.readouterr().out
+
+        with pytest.raises(ValueError, match="Число заголовков"):
+            processor.display_table(filtered, ['name', 'price'])
+
+    def test_read_rows_blank_and_ragged_lines(self, capsys):
+        processor = CSVProcessor()
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+            f.write("name,price\na,1\n\nb\nc,3,extra\n")
+            temp_path = f.name
+
+        try:
+            headers, rows = processor.read_rows(temp_path)
+        finally:
+            os.unlink(temp_path)
+
+        assert rows == [['a', '1'], ['b', ''], ['c', '3']]
+        assert processor.filter_data(rows, 'price', 'gt', '0', headers=headers) == [['a', '1'], ['c', '3']]
+        assert processor.filter_data(rows, 'name', 'eq', 'B', headers=headers) == [['b', '']]
+        assert processor.aggregate_data(rows, 'price', 'max', headers=headers) == 3.0
+
+        processor.display_table(rows, headers)
+        assert '| b    |       |' in capsys.readouterr().out
+
+    def test_read_rows_file_not_found(self):
+        with pytest.raises(FileNotFoundError):
+            CSVProcessor().read_rows('nonexistent_file.csv')
+
+    def test_read_columns(self, csv_file, capsys):
+        processor = CSVProcessor()
+        columns = processor.read_columns(csv_file)
+        assert list(columns) == ['name', 'brand', 'price', 'rating']
+        assert columns['price'].tolist() == ['999', '1199', '199', '299']
+
+        xiaomi = processor.filter_data(columns, 'brand', 'eq', 'xiaomi')
+        assert xiaomi['name'].tolist() == ['redmi note 12', 'poco x5 pro']
+        cheap = processor.filter_data(columns, 'price', 'lt', '1000')
+        assert cheap['brand'].tolist() == ['apple', 'xiaomi', 'xiaomi']
+
+        assert processor.aggregate_data(xiaomi, 'price', 'avg') == 249.0
+        assert processor.filter_and_aggregate(columns, 'price', 'gt', '500', 'rating', 'min') == 4.8
+
+        empty = processor.filter_data(columns, 'brand', 'eq', 'nokia')
+        assert processor.aggregate_data(empty, 'price', 'avg') == 0.0
+
+        processor.display_table(cheap, ['name', 'color'])
+        output = capsys.readouterr().out
+        assert '| poco x5 pro   |       |' in output
+
+        processor.display_table(empty)
+        assert 'Нет данных для отображения' in capsys.readouterr().out
+
+    def test_read_columns_ragged_and_empty_rows(self):
+        processor = CSVProcessor()
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+            f.write("a,b\n1\n\n2,3\n")
+            temp_path = f.name
+
+        try:
+            assert {k: v.tolist() for k, v in processor.read_columns(temp_path).items()} == \
+                {'a': ['1', '2'], 'b': ['', '3']}
+            assert len(processor.read_csv(temp_path)) == 2
+
+            with open(temp_path, 'w') as f:
+                f.write("a,b\n")
+            assert {k: v.tolist() for k, v in processor.read_columns(temp_path).items()} == \
+                {'a': [], 'b': []}
+        finally:
+            os.unlink(temp_path)
+
+    @pytest.mark.parametrize('use_pyarrow', [
+        pytest.param(True, marks=requires_pyarrow),
+        False,
+    ])
+    def test_iter_csv_chunks(self, csv_file, use_pyarrow, monkeypatch):
+        monkeypatch.setattr(csv_processor, 'HAS_PYARROW', use_pyarrow)
+        processor = CSVProcessor()
+        chunks = list(processor.iter_csv(csv_file, chunksize=3))
+        assert [len(chunk) for chunk in chunks] == [3, 1]
+        assert chunks[1].iloc[0]['name'] == 'poco x5 pro'
+        assert chunks[0]['price'].tolist() == ['999', '1199', '199']
+
+    @requires_pyarrow
+    def test_iter_csv_falls_back_after_arrow_error(self, csv_file, monkeypatch):
+        import pyarrow as pa
+
+        def broken_arrow_chunks(filepath, header, chunksize):
+            yield pd.DataFrame({'name': ['iphone 15 pro']})
+            raise pa.ArrowInvalid('Expected 4 columns, got 5')
+
+        monkeypatch.setattr(csv_processor, '_arrow_chunks', broken_arrow_chunks)
+        chunks = list(CSVProcessor().iter_csv(csv_file, chunksize=2))
+        names = [name for chunk in chunks for name in chunk['name']]
+        assert names == ['iphone 15 pro', 'galaxy s23 ultra', 'redmi note 12', 'poco x5 pro']
+
+    def test_iter_csv_file_not_found(self):
+        with pytest.raises(FileNotFoundError):
+            list(CSVProcessor().iter_csv('nonexistent_file.csv'))
+
+    def test_map_chunks_preserves_order(self):
+        processor = CSVProcessor()
+        chunks = (pd.DataFrame({'x': [i]}) for i in range(10))
+        results = processor.map_chunks(lambda chunk: int(chunk['x'][0]) * 2, chunks, max_workers=2)
+        assert list(results) == [i * 2 for i in range(10)]
+
+    @pytest.mark.parametrize('args, expected', [
+        (['--filter', 'brand=eq=xiaomi'], ['redmi note 12', 'poco x5 pro']),
+        (['--aggregate', 'price=max'], ['Максимум', '1199']),
+        (['--filter', 'brand=eq=xiaomi', '--aggregate', 'price=avg'], ['249']),
+        (['--filter', 'brand=eq=nokia'], ['Нет данных, соответствующих условию фильтрации']),
+        ([], ['iphone 15 pro', 'poco x5 pro']),
+    ])
+    @pytest.mark.parametrize('extra_fields', [False, True])
+    def test_main(self, csv_file, capsys, args, expected, extra_fields):
+        if extra_fields:
+            # Строка длиннее заголовка: лишняя ячейка отбрасывается, как в csv.DictReader
+            with open(csv_file, 'a') as f:
+                f.write("\ngalaxy a54,samsung,349,4.2,extra")
+
+        with patch('sys.argv', ['csv_processor.py', csv_file] + args), \
+                patch('csv_processor.CHUNK_SIZE', 2):
+            main()
+        output = capsys.readouterr().out
+        for text in expected:
+            assert text in output
+        assert 'extra' not in output
+
+    def test_main_custom_aggregation(self, csv_file, capsys, monkeypatch):
+        init = CSVProcessor.__init__
+
+        def init_with_sum(self):
+            init(self)
+            self.aggregation_functions['sum'] = lambda values: float(np.sum(values))
+
+        monkeypatch.setattr(CSVProcessor, '__init__', init_with_sum)
+        with patch('sys.argv', ['csv_processor.py', csv_file, '--aggregate', 'price=sum']), \
+                patch('csv_processor.CHUNK_SIZE', 2):
+            main()
+        assert '2696' in capsys.readouterr().out
+
+    def test_main_numeric_filter_stays_on_numpy(self, csv_file, capsys):
+        # Части CLI меньше порога numba: параллельность дают потоки map_chunks
+        assert csv_processor.CHUNK_SIZE < csv_processor.NUMBA_MIN_SIZE
+
+        with patch('sys.argv', ['csv_processor.py', csv_file, '--filter', 'price=gt=500']), \
+                patch('csv_processor._compiled', wraps=csv_processor._compiled) as compiled:
+            main()
+        compiled.assert_not_called()
+        assert 'galaxy s23 ultra' in capsys.readouterr().out
+
+    @requires_numba
+    def test_parallel_kernel_in_chunk_threads(self, csv_file, capsys):
+        # Первый параллельный запуск - в главном потоке: с пулом TBB запуск
+        # из рабочего потока первым приводит к зависанию при выходе
+        out = np.empty(1, dtype=np.bool_)
+        csv_processor._compiled_mask('gt')(np.ones(1), 0.0, out)
+
+        with patch('sys.argv', ['csv_processor.py', csv_file, '--filter', 'price=gt=500']), \
+                patch('csv_processor.CHUNK_SIZE', 2), patch('csv_processor.NUMBA_MIN_SIZE', 2), \
+                patch('csv_processor._compiled_mask',
+                      wraps=csv_processor._compiled_mask) as compiled:
+            main()
+        compiled.assert_called_with('gt')
+        output = capsys.readouterr().out
+        assert 'galaxy s23 ultra' in output
+        assert 'poco x5 pro' not in output
+
+    def test_main_errors(self, csv_file, capsys):
+        for args in (['--aggregate', 'name=avg'], ['--aggregate', 'price=sum'],
+                     ['--filter', 'size=eq=1']):
+            with patch('sys.argv', ['csv_processor.py', csv_file] + args):
+                with pytest.raises(SystemExit):
+                    main()
+            assert 'Ошибка' in capsys.readouterr().err
+
+    @pytest.mark.parametrize('content', ['', '\n'])
+    def test_main_empty_file(self, capsys, content):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+            f.write(content)
+            temp_path = f.name
+
+        try:
+            with patch('sys.argv', ['csv_processor.py', temp_path]):
+                main()
+            assert 'CSV файл пустой' in capsys.readouterr().out
+        finally:
+            os.unlink(temp_path)
+
+    def test_filter_and_aggregate_fused(self, csv_file):
+        processor = CSVProcessor()
+        data = processor.read_csv(csv_file)
+
+        for rows in (data, data.to_dict('records')):
+            expected = processor.aggregate_data(
+                processor.filter_data(rows, 'price', 'lt', '1000'), 'rating', 'min')
+            assert processor.filter_and_aggregate(rows, 'price', 'lt', '1000', 'rating', 'min') == expected
+            assert processor.filter_and_aggregate(rows, 'brand', 'eq', 'nokia', 'price', 'avg') == 0.0
+
+        assert processor.filter_and_aggregate([], 'brand', 'eq', 'x', 'price', 'avg') == 0.0
+        with pytest.raises(ValueError, match="Неподдерживаемая функция агрегации"):
+            processor.filter_and_aggregate(data, 'brand', 'eq', 'apple', 'price', 'sum')
+        with pytest.raises(ValueError, match="нет числовых значений для агрегации"):
+            processor.filter_and_aggregate(data, 'brand', 'eq', 'apple', 'name', 'max')
+
     def test_filter_no_results(self, csv_file):
         processor = CSVProcessor()
         data = processor.read_csv(csv_file)